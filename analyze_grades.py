@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import json
+import argparse
+import warnings
+from array import array
+import numpy as np
+
+# Campos do aluno armazenados como categorias (código inteiro + lista de valores)
+CATEGORICAL_FIELDS = {
+    'inep': 'INEP Escola',
+    'crede': 'CREDE',
+    'municipio': 'Municipio',
+    'escola': 'Escola',
+}
+
+# Espaços e delimitadores da lista entre registros
+RECORD_DELIMITERS = re.compile(r'[\s\[\],]*')
+
+
+def iter_records(path, chunk_size=1 << 20):
+    """Lê os registros de um JSON gerado por process_pdf (lista ou JSON Lines) um a um, sem carregar o arquivo inteiro"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            # Avança sobre os delimitadores da lista entre os objetos, sem copiar o buffer
+            pos = RECORD_DELIMITERS.match(buffer, pos).end()
+            if pos < len(buffer):
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                    yield record
+                    continue
+                except json.JSONDecodeError:
+                    # Objeto incompleto: lê mais um bloco do arquivo
+                    if eof:
+                        raise
+            elif eof:
+                return
+
+            # Descarta o trecho já consumido apenas ao ler um novo bloco
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def parse_grade(value):
+    """Converte uma nota extraída ('6.0', '6,0' ou 'N/A') para float; retorna NaN se inválida"""
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_table(records):
+    """Monta a estrutura colunar (categorias + matriz de notas) a partir de um iterável de registros"""
+    categories = {key: {} for key in CATEGORICAL_FIELDS}
+    codes = {key: array('i') for key in CATEGORICAL_FIELDS}
+    subjects = {}
+    names = []
+    enrollments = []
+
+    # Notas guardadas como triplas (linha, coluna, valor) e espalhadas na matriz ao final
+    grade_rows = array('i')
+    grade_cols = array('i')
+    grade_values = array('d')
+
+    # Disciplinas presentes no registro, mas sem nota numérica ('N/A' ou falha do OCR)
+    failure_rows = array('i')
+    failure_cols = array('i')
+
+    n_students = 0
+    for record in records:
+        if not isinstance(record, dict) or 'error' in record:
+            continue
+
+        for key, field in CATEGORICAL_FIELDS.items():
+            value = str(record.get(field, 'N/A')).strip()
+            codes[key].append(categories[key].setdefault(value, len(categories[key])))
+
+        names.append(str(record.get('Aluno(a)', 'N/A')).strip())
+        enrollments.append(str(record.get('Matrícula', 'N/A')).strip())
+
+        for subject, grade in (record.get('Disciplinas') or {}).items():
+            # A coluna é criada mesmo que a disciplina só tenha 'N/A', para que a falha apareça nos relatórios
+            column = subjects.setdefault(subject.strip(), len(subjects))
+            value = parse_grade(grade)
+            if np.isnan(value):
+                failure_rows.append(n_students)
+                failure_cols.append(column)
+                continue
+            grade_rows.append(n_students)
+            grade_cols.append(column)
+            grade_values.append(value)
+
+        n_students += 1
+
+    grades = np.full((n_students, len(subjects)), np.nan, dtype=np.float32)
+    grades[np.frombuffer(grade_rows, dtype=np.int32), np.frombuffer(grade_cols, dtype=np.int32)] = \
+        np.frombuffer(grade_values, dtype=np.float64)
+
+    failures = np.zeros((n_students, len(subjects)), dtype=bool)
+    failures[np.frombuffer(failure_rows, dtype=np.int32), np.frombuffer(failure_cols, dtype=np.int32)] = True
+
+    return {
+        'disciplinas': list(subjects),
+        'notas': grades,
+        'falhas': failures,
+        'categorias': {key: list(values) for key, values in categories.items()},
+        'codigos': {key: np.frombuffer(codes[key], dtype=np.int32).copy() for key in CATEGORICAL_FIELDS},
+        'alunos': np.array(names, dtype=str),
+        'matriculas': np.array(enrollments, dtype=str),
+    }
+
+
+def save_table(table, path):
+    """Salva a estrutura colunar em um arquivo .npz compacto"""
+    arrays = {
+        'disciplinas': np.array(table['disciplinas'], dtype=str),
+        'notas': table['notas'],
+        'falhas': table['falhas'],
+        'alunos': table['alunos'],
+        'matriculas': table['matriculas'],
+    }
+    for key in CATEGORICAL_FIELDS:
+        arrays[f'codigos_{key}'] = table['codigos'][key]
+        arrays[f'categorias_{key}'] = np.array(table['categorias'][key], dtype=str)
+
+    np.savez_compressed(path, **arrays)
+
+
+def load_table(path):
+    """Carrega a estrutura colunar salva por save_table"""
+    with np.load(path) as data:
+        return {
+            'disciplinas': data['disciplinas'].tolist(),
+            'notas': data['notas'],
+            # Arquivos salvos antes da máscara de falhas não distinguem 'N/A' de disciplina ausente
+            'falhas': data['falhas'] if 'falhas' in data else np.zeros(data['notas'].shape, dtype=bool),
+            'categorias': {key: data[f'categorias_{key}'].tolist() for key in CATEGORICAL_FIELDS},
+            'codigos': {key: data[f'codigos_{key}'] for key in CATEGORICAL_FIELDS},
+            'alunos': data['alunos'],
+            'matriculas': data['matriculas'],
+        }
+
+
+def load_results(paths):
+    """Carrega um ou mais arquivos de resultados (.json de process_pdf ou .npz de save_table)"""
+    if len(paths) == 1 and paths[0].endswith('.npz'):
+        return load_table(paths[0])
+
+    if any(path.endswith('.npz') for path in paths):
+        raise ValueError("Arquivos .npz não podem ser combinados com outros arquivos")
+
+    return build_table(record for path in paths for record in iter_records(path))
+
+
+def subject_index(table, subject):
+    """Localiza a coluna de uma disciplina pelo nome (sem diferenciar maiúsculas)"""
+    wanted = subject.strip().casefold()
+    for i, name in enumerate(table['disciplinas']):
+        if name.casefold() == wanted:
+            return i
+    raise KeyError(f"Disciplina não encontrada: {subject}")
+
+
+def group_means(table, by):
+    """Calcula médias e contagens de notas por grupo (inep, crede, municipio ou escola) e disciplina"""
+    grades = table['notas']
+    codes = table['codigos'][by]
+    n_groups = len(table['categorias'][by])
+    n_subjects = grades.shape[1]
+
+    # Índice linear (grupo, disciplina) para agregar tudo com um único bincount
+    valid = ~np.isnan(grades)
+    flat_index = (codes[:, None] * n_subjects + np.arange(n_subjects))[valid]
+    size = n_groups * n_subjects
+
+    sums = np.bincount(flat_index, weights=grades[valid], minlength=size).reshape(n_groups, n_subjects)
+    counts = np.bincount(flat_index, minlength=size).reshape(n_groups, n_subjects)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+
+    return table['categorias'][by], means, counts
+
+
+def subject_summary(table):
+    """Calcula estatísticas por disciplina (contagem, N/A, ausentes, média, desvio, mínimo, mediana, máximo)"""
+    grades = table['notas']
+    counts = np.count_nonzero(~np.isnan(grades), axis=0)
+    failures = np.count_nonzero(table['falhas'], axis=0)
+    summary = {
+        'contagem': counts,
+        'n/a': failures,
+        'ausente': grades.shape[0] - counts - failures,
+    }
+
+    # Disciplinas sem nenhuma nota resultam em NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        summary['media'] = np.nanmean(grades, axis=0)
+        summary['desvio'] = np.nanstd(grades, axis=0)
+        summary['minimo'] = np.nanmin(grades, axis=0) if grades.size else np.full(grades.shape[1], np.nan)
+        summary['mediana'] = np.nanmedian(grades, axis=0)
+        summary['maximo'] = np.nanmax(grades, axis=0) if grades.size else np.full(grades.shape[1], np.nan)
+
+    return summary
+
+
+def subject_distribution(table, subject, bins=10, grade_range=(0.0, 10.0)):
+    """Calcula o histograma das notas de uma disciplina"""
+    column = table['notas'][:, subject_index(table, subject)]
+    return np.histogram(column[~np.isnan(column)], bins=bins, range=grade_range)
+
+
+def failing_students(table, min_grade=6.0, subject=None):
+    """Retorna os índices dos alunos com nota abaixo do mínimo e a máscara de disciplinas reprovadas"""
+    grades = table['notas']
+    if subject is not None:
+        column = subject_index(table, subject)
+        mask = np.zeros_like(grades, dtype=bool)
+        mask[:, column] = grades[:, column] < min_grade
+    else:
+        mask = grades < min_grade  # NaN nunca é menor que o mínimo
+
+    return np.flatnonzero(mask.any(axis=1)), mask
+
+
+def format_grade(value):
+    """Formata uma nota para exibição"""
+    return 'N/A' if np.isnan(value) else f"{value:.2f}"
+
+
+def print_group_means(table, by, subject=None):
+    """Exibe as médias por grupo"""
+    groups, means, counts = group_means(table, by)
+    columns = range(len(table['disciplinas'])) if subject is None else [subject_index(table, subject)]
+
+    for g, group in enumerate(groups):
+        print(f"\n{CATEGORICAL_FIELDS[by]}: {group}")
+        for column in columns:
+            if counts[g, column]:
+                print(f"  {table['disciplinas'][column]}: {format_grade(means[g, column])} "
+                      f"({counts[g, column]} notas)")
+
+
+def print_subject_summary(table):
+    """Exibe as estatísticas de cada disciplina"""
+    summary = subject_summary(table)
+    print(f"{'Disciplina':<40} {'Notas':>7} {'N/A':>6} {'Ausente':>8} {'Média':>7} {'Desvio':>7} "
+          f"{'Mín':>6} {'Mediana':>8} {'Máx':>6}")
+    for i, subject in enumerate(table['disciplinas']):
+        print(f"{subject:<40} {summary['contagem'][i]:>7} {summary['n/a'][i]:>6} {summary['ausente'][i]:>8} "
+              f"{format_grade(summary['media'][i]):>7} {format_grade(summary['desvio'][i]):>7} "
+              f"{format_grade(summary['minimo'][i]):>6} {format_grade(summary['mediana'][i]):>8} "
+              f"{format_grade(summary['maximo'][i]):>6}")
+
+
+def print_distribution(table, subject, bins):
+    """Exibe o histograma das notas de uma disciplina"""
+    hist, edges = subject_distribution(table, subject, bins)
+    total = hist.sum()
+    print(f"Distribuição de notas: {table['disciplinas'][subject_index(table, subject)]} ({total} notas)")
+    for count, start, end in zip(hist, edges[:-1], edges[1:]):
+        bar = '#' * int(round(40 * count / total)) if total else ''
+        print(f"  {start:5.2f} - {end:5.2f}: {count:>7} {bar}")
+
+
+def print_failing(table, min_grade, subject=None):
+    """Exibe a lista de alunos com notas abaixo do mínimo"""
+    students, mask = failing_students(table, min_grade, subject)
+    subjects = np.array(table['disciplinas'], dtype=object)
+    schools = table['categorias']['escola']
+    school_codes = table['codigos']['escola']
+
+    print(f"Alunos com nota abaixo de {min_grade}: {len(students)}")
+    for i in students:
+        failed = ', '.join(f"{name} ({format_grade(table['notas'][i, j])})"
+                           for j, name in zip(np.flatnonzero(mask[i]), subjects[mask[i]]))
+        print(f"- {table['alunos'][i]} | Matrícula: {table['matriculas'][i]} | "
+              f"Escola: {schools[school_codes[i]]} | {failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera relatórios a partir dos resultados extraídos dos boletins')
+    parser.add_argument('resultados', nargs='+', help='Arquivos JSON gerados por get_grades.py ou um arquivo .npz')
+    subparsers = parser.add_subparsers(dest='relatorio', required=True)
+
+    medias = subparsers.add_parser('medias', help='Médias por grupo e disciplina')
+    medias.add_argument('--por', choices=list(CATEGORICAL_FIELDS), default='inep',
+                        help='Agrupamento (padrão: inep)')
+    medias.add_argument('--disciplina', help='Restringe a uma disciplina')
+
+    subparsers.add_parser('resumo', help='Estatísticas por disciplina')
+
+    distribuicao = subparsers.add_parser('distribuicao', help='Histograma das notas de uma disciplina')
+    distribuicao.add_argument('--disciplina', required=True, help='Nome da disciplina')
+    distribuicao.add_argument('--faixas', type=int, default=10, help='Número de faixas (padrão: 10)')
+
+    reprovados = subparsers.add_parser('reprovados', help='Alunos com nota abaixo do mínimo')
+    reprovados.add_argument('--nota-minima', type=float, default=6.0, help='Nota mínima (padrão: 6.0)')
+    reprovados.add_argument('--disciplina', help='Restringe a uma disciplina')
+
+    converter = subparsers.add_parser('converter', help='Salva os resultados no formato colunar .npz')
+    converter.add_argument('-o', '--output', required=True, help='Arquivo .npz de saída')
+
+    args = parser.parse_args()
+
+    try:
+        table = load_results(args.resultados)
+    except Exception as e:
+        print(f"Erro ao carregar resultados: {e}")
+        return
+
+    print(f"{len(table['alunos'])} alunos e {len(table['disciplinas'])} disciplinas carregados\n")
+
+    try:
+        if args.relatorio == 'medias':
+            print_group_means(table, args.por, args.disciplina)
+        elif args.relatorio == 'resumo':
+            print_subject_summary(table)
+        elif args.relatorio == 'distribuicao':
+            print_distribution(table, args.disciplina, args.faixas)
+        elif args.relatorio == 'reprovados':
+            print_failing(table, args.nota_minima, args.disciplina)
+        elif args.relatorio == 'converter':
+            save_table(table, args.output)
+            print(f"Resultados salvos em {args.output}")
+    except KeyError as e:
+        print(f"Erro: {e.args[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import re
 import json
 import argparse
 from pdf2image import convert_from_path
@@ -19,6 +20,37 @@ def safe_crop(image, x0, y0, x1, y1):
     return image[y0:y1, x0:x1]
 
 
+def render_page_gray(pdf_path, page_num=0, dpi=500):
+    """Converte uma página do PDF diretamente para um array em escala de cinza"""
+    images = convert_from_path(pdf_path, first_page=page_num + 1, last_page=page_num + 1, dpi=dpi, grayscale=True)
+    if not images:
+        return None
+
+    # Imagem 'L' (um canal): evita a cópia RGB/BGR de três canais da página inteira
+    return np.asarray(images[0])
+
+
+def clean_subject_text(text):
+    """Normaliza o texto de uma célula de disciplina; retorna None se não parecer um nome válido"""
+    text = ' '.join(text.split()).strip()
+
+    # Filtra resultados
+    if (len(text) <= 3 or
+            not any(c.isalpha() for c in text) or
+            any(text.startswith(prefix) for prefix in [' ', '.', ',', ';', '-'])):
+        return None
+
+    # Pós-processamento do texto
+    clean_text = text.split('\n')[0].strip()
+    clean_text = ''.join(
+        c for c in clean_text if c.isalnum() or c in ' -áéíóúâêîôûãõàèìòùçÁÉÍÓÚÂÊÎÔÛÃÕÀÈÌÒÙÇ')
+
+    if len(clean_text.split()) < 1:
+        return None
+
+    return clean_text
+
+
 def save_coordinates_to_json(matched_data, output_filename, img_width, img_height):
     """Salva as coordenadas em um arquivo JSON com disciplinas e suas notas correspondentes, incluindo tamanhos"""
     try:
@@ -81,47 +113,38 @@ def save_coordinates_to_json(matched_data, output_filename, img_width, img_heigh
         return False
 
 
-def detect_individual_notes(pdf_path, page_num=0, padding=10):
+def detect_individual_notes(pdf_path, page_num=0, padding=10, gray=None):
     """Detecta e marca cada nota individualmente na coluna de notas"""
     try:
-        # Converte o PDF para imagem
-        images = convert_from_path(pdf_path, first_page=page_num + 1, last_page=page_num + 1, dpi=500)
-        if not images:
-            print("Nenhuma imagem encontrada no PDF.")
-            return None, None
+        # Reaproveita a página já convertida, se fornecida
+        if gray is None:
+            gray = render_page_gray(pdf_path, page_num)
+            if gray is None:
+                print("Nenhuma imagem encontrada no PDF.")
+                return None, None
 
-        img = images[0]
-        width, height = img.size
+        height, width = gray.shape[:2]
 
         # Verifica se a imagem foi carregada corretamente
         if width == 0 or height == 0:
             print("Dimensões inválidas da imagem convertida.")
             return None, None
 
-        # Converte para OpenCV format (BGR)
-        open_cv_image = np.array(img)
-        if open_cv_image.size == 0:
-            print("Falha ao converter imagem para formato OpenCV.")
-            return None, None
-
-        open_cv_image = open_cv_image[:, :, ::-1].copy()  # Convert RGB to BGR
-
         # Define a região aproximada da coluna de notas (ajuste conforme necessário)
         notes_region_x0 = int(width * 0.5930)
         notes_region_x1 = int(width * 0.6315)
         notes_region_y0 = int(height * 0.26)
         notes_region_y1 = int(height * 0.685)
 
-        # Recorta a região de interesse com verificação de limites
-        roi = safe_crop(open_cv_image, notes_region_x0, notes_region_y0, notes_region_x1, notes_region_y1)
+        # Recorta a região de interesse com verificação de limites (view, sem cópia)
+        roi = safe_crop(gray, notes_region_x0, notes_region_y0, notes_region_x1, notes_region_y1)
         if roi is None:
             print("Região de interesse (ROI) está vazia ou inválida. Ajuste as coordenadas da região de notas.")
             return None, None
 
-        # Pré-processamento da imagem para melhorar o OCR
+        # Pré-processamento apenas da região de interesse
         try:
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+            thresh = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
         except Exception as e:
             print(f"Erro no pré-processamento da imagem: {str(e)}")
             return None, None
@@ -166,24 +189,20 @@ def detect_individual_notes(pdf_path, page_num=0, padding=10):
             print("Nenhuma nota foi detectada na região especificada.")
             return None, None
 
-        return img, individual_notes
+        return gray, individual_notes
 
     except Exception as e:
         print(f"Erro inesperado em detect_individual_notes: {str(e)}")
         return None, None
 
 
-def extract_subjects(img, width, height):
+def extract_subjects(gray, width, height):
     """Extrai os nomes das disciplinas ignorando regiões específicas"""
     try:
-        # Converte a imagem para OpenCV (BGR)
-        open_cv_image = np.array(img)
-        if open_cv_image.size == 0:
+        if gray.size == 0:
             print("Imagem vazia na extração de disciplinas.")
             return [], []
 
-        open_cv_image = open_cv_image[:, :, ::-1].copy()  # Convert RGB to BGR
-
         # Define a região principal das disciplinas
         main_region = {
             'x0': int(width * 0.02),
@@ -234,9 +253,9 @@ def extract_subjects(img, width, height):
             }
         ]
 
-        # Pré-processamento global
-        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (3, 3), 0)
+        # Pré-processamento apenas da região principal (view da página, sem cópia)
+        main_roi = safe_crop(gray, main_region['x0'], main_region['y0'], main_region['x1'], main_region['y1'])
+        blur = cv2.GaussianBlur(main_roi, (3, 3), 0)
         thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
 
         # Divide a região principal em faixas verticais válidas
@@ -270,8 +289,9 @@ def extract_subjects(img, width, height):
         subjects = []
         subject_boxes = []
         for region in valid_regions:
-            # Recorta a região válida com verificação de limites
-            roi = safe_crop(thresh, region['x0'], region['y0'], region['x1'], region['y1'])
+            # Recorta a região válida (coordenadas relativas à região principal)
+            roi = safe_crop(thresh, region['x0'] - main_region['x0'], region['y0'] - main_region['y0'],
+                            region['x1'] - main_region['x0'], region['y1'] - main_region['y0'])
             if roi is None:
                 continue
 
@@ -304,30 +324,21 @@ def extract_subjects(img, width, height):
 
                 # Executa o OCR
                 text = pytesseract.image_to_string(subject_area, config=custom_config, lang='por')
-                text = ' '.join(text.split()).strip()
 
                 # Filtra resultados
-                if (len(text) > 3 and
-                        any(c.isalpha() for c in text) and
-                        not any(text.startswith(prefix) for prefix in [' ', '.', ',', ';', '-'])):
-
-                    # Pós-processamento do texto
-                    clean_text = text.split('\n')[0].strip()
-                    clean_text = ''.join(
-                        c for c in clean_text if c.isalnum() or c in ' -áéíóúâêîôûãõàèìòùçÁÉÍÓÚÂÊÎÔÛÃÕÀÈÌÒÙÇ')
-
-                    if len(clean_text.split()) >= 1:
-                        # Calcula as coordenadas da caixa da disciplina
-                        box_x0 = region['x0']
-                        box_y0 = region['y0'] + y_start
-                        box_x1 = region['x1']
-                        box_y1 = region['y0'] + y_end
-
-                        subjects.append(clean_text)
-                        subject_boxes.append({
-                            'text': clean_text,
-                            'coords': (box_x0, box_y0, box_x1, box_y1)
-                        })
+                clean_text = clean_subject_text(text)
+                if clean_text:
+                    # Calcula as coordenadas da caixa da disciplina
+                    box_x0 = region['x0']
+                    box_y0 = region['y0'] + y_start
+                    box_x1 = region['x1']
+                    box_y1 = region['y0'] + y_end
+
+                    subjects.append(clean_text)
+                    subject_boxes.append({
+                        'text': clean_text,
+                        'coords': (box_x0, box_y0, box_x1, box_y1)
+                    })
 
         return subjects, subject_boxes
 
@@ -336,6 +347,289 @@ def extract_subjects(img, width, height):
         return [], []
 
 
+def find_line_positions(profile, min_fill):
+    """Agrupa posições consecutivas de um perfil de projeção em linhas (início, fim)"""
+    idx = np.flatnonzero(profile >= min_fill)
+    if idx.size == 0:
+        return []
+
+    breaks = np.flatnonzero(np.diff(idx) > 1)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]]))
+    return [(int(s), int(e)) for s, e in zip(starts, ends)]
+
+
+def detect_table_grid(thresh, min_cell_frac=0.005, page_size=None):
+    """Detecta a grade da tabela principal (linhas e colunas) em uma única passada de morfologia"""
+    try:
+        # Os kernels e tamanhos mínimos são relativos à página, mesmo quando thresh é um recorte
+        w, h = page_size if page_size else thresh.shape[::-1]
+
+        # Morfologia horizontal e vertical sobre a mesma imagem binarizada
+        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(w // 40, 10), 1))
+        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(h // 120, 10)))
+        horizontal = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+        vertical = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+
+        # A tabela principal é o maior componente formado pelas linhas
+        grid_mask = cv2.bitwise_or(horizontal, vertical)
+        cnts = cv2.findContours(grid_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+        if not cnts:
+            return None
+
+        tx, ty, tw, th = max((cv2.boundingRect(c) for c in cnts), key=lambda r: r[2] * r[3])
+        table_h = horizontal[ty:ty + th, tx:tx + tw]
+        table_v = vertical[ty:ty + th, tx:tx + tw]
+
+        # Projeções: separadores de linha cruzam quase toda a tabela; os de coluna
+        # são interrompidos nas faixas de título (células mescladas)
+        h_lines = find_line_positions(np.count_nonzero(table_h, axis=1), 0.5 * tw)
+        v_lines = find_line_positions(np.count_nonzero(table_v, axis=0), 0.3 * th)
+        if len(h_lines) < 2 or len(v_lines) < 2:
+            return None
+
+        min_row = max(3, int(h * min_cell_frac))
+        min_col = max(3, int(w * min_cell_frac))
+
+        rows = [(ty + a[1] + 1, ty + b[0]) for a, b in zip(h_lines, h_lines[1:]) if b[0] - a[1] > min_row]
+        cols = [(tx + a[1] + 1, tx + b[0]) for a, b in zip(v_lines, v_lines[1:]) if b[0] - a[1] > min_col]
+        if not rows or not cols:
+            return None
+
+        # Para cada faixa, verifica se as bordas esquerda e direita de cada coluna existem
+        def has_border(y0, y1, x):
+            band = vertical[y0:y1, max(0, x - 3):x + 4]
+            return band.size > 0 and np.count_nonzero(band.any(axis=1)) >= 0.5 * (y1 - y0)
+
+        split = [[has_border(y0, y1, x0 - 1) and has_border(y0, y1, x1) for x0, x1 in cols]
+                 for y0, y1 in rows]
+
+        return {
+            'bbox': (tx, ty, tx + tw, ty + th),
+            'rows': rows,
+            'cols': cols,
+            'split': split
+        }
+
+    except Exception as e:
+        print(f"Erro inesperado em detect_table_grid: {str(e)}")
+        return None
+
+
+def ocr_cells_batched(gray, boxes, config, lang=None, gap=20, max_height=30000):
+    """Empilha as células em uma única imagem e executa um só OCR, devolvendo texto e caixa de cada célula"""
+    results = [{'text': '', 'box': None} for _ in boxes]
+
+    # Recorta cada célula afastando-se das bordas da grade
+    segments = []
+    for i, (x0, y0, x1, y1) in enumerate(boxes):
+        inset = max(3, (y1 - y0) // 8)
+        crop = safe_crop(gray, x0 + inset, y0 + inset, x1 - inset, y1 - inset)
+        if crop is not None:
+            segments.append((i, crop, x0 + inset, y0 + inset))
+
+    # Divide em pilhas que respeitam a altura máxima aceita pelo Tesseract
+    groups = []
+    group_height = gap
+    for segment in segments:
+        if not groups or group_height + segment[1].shape[0] + gap > max_height:
+            groups.append([])
+            group_height = gap
+        groups[-1].append(segment)
+        group_height += segment[1].shape[0] + gap
+
+    words = [[] for _ in boxes]
+    for group in groups:
+        stack_w = max(crop.shape[1] for _, crop, _, _ in group)
+        stack_h = sum(crop.shape[0] + gap for _, crop, _, _ in group) + gap
+        stack = np.full((stack_h, stack_w), 255, dtype=np.uint8)
+
+        starts = []
+        y = gap
+        for _, crop, _, _ in group:
+            stack[y:y + crop.shape[0], :crop.shape[1]] = crop
+            starts.append(y)
+            y += crop.shape[0] + gap
+
+        data = pytesseract.image_to_data(stack, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+        # Devolve cada palavra à célula de origem pela posição vertical no empilhamento
+        for k in range(len(data['text'])):
+            text = data['text'][k].strip()
+            if not text:
+                continue
+
+            center_y = data['top'][k] + data['height'][k] / 2
+            pos = int(np.searchsorted(starts, center_y, side='right')) - 1
+            if pos < 0:
+                continue
+
+            i, crop, origin_x, origin_y = group[pos]
+            if center_y >= starts[pos] + crop.shape[0]:
+                continue
+
+            x = data['left'][k] + origin_x
+            y = data['top'][k] - starts[pos] + origin_y
+            order = (data['block_num'][k], data['par_num'][k], data['line_num'][k], data['word_num'][k])
+            words[i].append((order, text, (x, y, x + data['width'][k], y + data['height'][k])))
+
+    for i, cell_words in enumerate(words):
+        if not cell_words:
+            continue
+
+        cell_words.sort(key=lambda w: w[0])
+        results[i]['text'] = ' '.join(w[1] for w in cell_words)
+        results[i]['box'] = (
+            min(w[2][0] for w in cell_words),
+            min(w[2][1] for w in cell_words),
+            max(w[2][2] for w in cell_words),
+            max(w[2][3] for w in cell_words)
+        )
+
+    return results
+
+
+def is_grade_text(text):
+    """Indica se o texto parece uma nota (ex.: '6,0', '7.5', '10,00')"""
+    text = text.replace(' ', '')
+    if not re.fullmatch(r'\d{1,2}[.,]\d{1,2}', text):
+        return False
+    return 0 <= float(text.replace(',', '.')) <= 10
+
+
+def choose_grade_column(gray, rows, cols, split, subject_column=0, min_share=0.6):
+    """Escolhe a coluna de notas pelo conteúdo: a única cujas células divididas são, em sua maioria, notas"""
+    config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789.,'
+
+    # Um único OCR em lote para as células divididas de todas as colunas candidatas
+    cells = [(i, j) for j in range(len(cols)) if j != subject_column
+             for i in range(len(rows)) if split[i][j]]
+    boxes = [(cols[j][0], rows[i][0], cols[j][1], rows[i][1]) for i, j in cells]
+    ocr = ocr_cells_batched(gray, boxes, config)
+
+    per_column = {}
+    for (i, j), result in zip(cells, ocr):
+        per_column.setdefault(j, {})[i] = result
+
+    shares = {j: sum(is_grade_text(r['text']) for r in results.values()) / len(results)
+              for j, results in per_column.items()}
+    qualified = [j for j, share in shares.items() if share >= min_share]
+
+    if len(qualified) != 1:
+        summary = ', '.join(f"{j}: {share:.0%}" for j, share in sorted(shares.items()))
+        print(f"Não foi possível determinar a coluna de notas ({len(qualified)} colunas com notas; "
+              f"proporção por coluna: {summary}). Informe-a com -gc/--grade-column.")
+        return None, {}
+
+    return qualified[0], per_column[qualified[0]]
+
+
+def locate_table(gray, scale=4, margin_frac=0.01):
+    """Localiza a tabela principal em uma versão reduzida da página e devolve sua caixa em resolução total"""
+    height, width = gray.shape[:2]
+    small = cv2.resize(gray, (max(1, width // scale), max(1, height // scale)), interpolation=cv2.INTER_AREA)
+    small_thresh = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+    grid = detect_table_grid(small_thresh)
+    if grid is None:
+        return None
+
+    margin_x, margin_y = int(width * margin_frac), int(height * margin_frac)
+    x0, y0, x1, y1 = grid['bbox']
+    return (max(0, x0 * scale - margin_x), max(0, y0 * scale - margin_y),
+            min(width, x1 * scale + margin_x), min(height, y1 * scale + margin_y))
+
+
+def extract_table_cells(gray, grade_column=None, subject_column=0, padding=10):
+    """Extrai disciplinas e notas a partir da grade da tabela, com OCR em lote por coluna
+
+    Retorna (None, None, None) quando a coluna de notas não é informada nem pode ser determinada.
+    """
+    try:
+        if gray.size == 0:
+            print("Imagem vazia na detecção da tabela.")
+            return [], [], []
+
+        height, width = gray.shape[:2]
+
+        # Localiza a tabela em baixa resolução e pré-processa apenas o seu recorte
+        table_box = locate_table(gray)
+        if table_box is None:
+            print("Nenhuma grade de tabela foi detectada.")
+            return [], [], []
+
+        tx0, ty0, tx1, ty1 = table_box
+        roi = safe_crop(gray, tx0, ty0, tx1, ty1)
+        blur = cv2.GaussianBlur(roi, (3, 3), 0)
+        thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+        grid = detect_table_grid(thresh, page_size=(width, height))
+        if grid is None:
+            print("Nenhuma grade de tabela foi detectada.")
+            return [], [], []
+
+        # Converte linhas e colunas para coordenadas da página
+        rows = [(y0 + ty0, y1 + ty0) for y0, y1 in grid['rows']]
+        cols = [(x0 + tx0, x1 + tx0) for x0, x1 in grid['cols']]
+
+        if not (0 <= subject_column < len(cols)) or (grade_column is not None and not 0 <= grade_column < len(cols)):
+            print(f"Coluna inválida: a tabela detectada possui {len(cols)} colunas.")
+            return [], [], []
+
+        # Sem coluna informada, escolhe a coluna de notas pelo conteúdo das células
+        grade_ocr_by_row = None
+        if grade_column is None:
+            grade_column, grade_ocr_by_row = choose_grade_column(gray, rows, cols, grid['split'], subject_column)
+            if grade_column is None:
+                return None, None, None
+            print(f"Coluna de notas detectada: {grade_column}")
+
+        # Faixas de título mesclam as colunas e não são divididas na coluna de notas
+        candidates = [i for i in range(len(rows)) if grid['split'][i][grade_column]]
+        subject_cells = [(cols[subject_column][0], rows[i][0], cols[subject_column][1], rows[i][1])
+                         for i in candidates]
+        grade_cells = [(cols[grade_column][0], rows[i][0], cols[grade_column][1], rows[i][1])
+                       for i in candidates]
+
+        subject_ocr = ocr_cells_batched(gray, subject_cells, r'--oem 3 --psm 6 -c preserve_interword_spaces=1',
+                                        lang='por')
+        if grade_ocr_by_row is not None:
+            # Reaproveita o OCR feito na escolha da coluna
+            grade_ocr = [grade_ocr_by_row[i] for i in candidates]
+        else:
+            grade_ocr = ocr_cells_batched(gray, grade_cells,
+                                          r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789.,')
+
+        subjects = []
+        subject_boxes = []
+        notes = []
+        for subject_cell, subject_result, grade_result in zip(subject_cells, subject_ocr, grade_ocr):
+            clean_text = clean_subject_text(subject_result['text'])
+            note_text = grade_result['text'].replace(' ', '')
+            if not clean_text or grade_result['box'] is None or not any(c.isdigit() for c in note_text):
+                continue
+
+            x, y, x_end, y_end = grade_result['box']
+            subjects.append(clean_text)
+            subject_boxes.append({
+                'text': clean_text,
+                'coords': subject_cell
+            })
+            notes.append({
+                'text': note_text,
+                'coords': (max(0, x - padding), max(0, y - padding),
+                           min(width, x_end + padding), min(height, y_end + padding)),
+                'original_coords': (x, y, x_end, y_end)
+            })
+
+        return subjects, subject_boxes, notes
+
+    except Exception as e:
+        print(f"Erro inesperado em extract_table_cells: {str(e)}")
+        return [], [], []
+
+
 def match_notes_with_subjects(notes, subjects, subject_boxes):
     """Associa cada nota à disciplina correspondente pela ordem de aparição"""
     try:
@@ -359,7 +653,8 @@ def match_notes_with_subjects(notes, subjects, subject_boxes):
 def draw_matches(img, matched_data):
     """Desenha as marcações e linhas conectando notas e disciplinas"""
     try:
-        img_with_boxes = img.copy()
+        # A conversão para RGB já gera uma nova imagem; só copia se a página já for colorida
+        img_with_boxes = img.copy() if img.mode == 'RGB' else img.convert('RGB')
         draw = ImageDraw.Draw(img_with_boxes)
 
         try:
@@ -410,35 +705,48 @@ def main():
     parser.add_argument('-o', '--output', required=True, help='Nome do arquivo JSON para salvar as coordenadas')
     parser.add_argument('-p', '--page', type=int, default=0, help='Número da página a ser processada (0-based)')
     parser.add_argument('-pd', '--padding', type=int, default=10, help='Padding para as caixas de detecção')
+    parser.add_argument('-gc', '--grade-column', type=int, default=None,
+                        help='Índice (0-based) da coluna de notas na tabela detectada '
+                             '(obrigatório quando não puder ser determinada pelo conteúdo)')
+    parser.add_argument('-sc', '--subject-column', type=int, default=0,
+                        help='Índice (0-based) da coluna de disciplinas na tabela detectada (padrão: 0)')
 
     args = parser.parse_args()
 
     try:
-        # Converte o PDF para imagem
-        images = convert_from_path(args.pdf_path, first_page=args.page + 1, last_page=args.page + 1, dpi=500)
-        if not images:
+        # Converte o PDF diretamente para escala de cinza
+        gray = render_page_gray(args.pdf_path, args.page)
+        if gray is None:
             print("Nenhuma imagem encontrada no PDF.")
             return
 
-        img = images[0]
-        width, height = img.size
+        height, width = gray.shape[:2]
 
-        # Extrai os nomes das disciplinas e suas coordenadas
-        subjects, subject_boxes = extract_subjects(img, width, height)
-        if not subjects:
-            print("Nenhuma disciplina foi detectada.")
-            return
+        # Detecta a grade da tabela e extrai disciplinas e notas de uma só vez
+        subjects, subject_boxes, notes = extract_table_cells(
+            gray, args.grade_column, args.subject_column, args.padding)
 
-        # Detecta as notas individuais
-        img, notes = detect_individual_notes(args.pdf_path, args.page, args.padding)
-        if not notes:
+        if subjects is None:
             return
 
+        if not subjects:
+            # Recorre às regiões fixas do modelo original
+            print("Grade da tabela não utilizável, usando as regiões fixas do modelo.")
+            subjects, subject_boxes = extract_subjects(gray, width, height)
+            if not subjects:
+                print("Nenhuma disciplina foi detectada.")
+                return
+
+            # Detecta as notas individuais
+            gray, notes = detect_individual_notes(args.pdf_path, args.page, args.padding, gray=gray)
+            if not notes:
+                return
+
         # Associa notas com disciplinas
         matched_data = match_notes_with_subjects(notes, subjects, subject_boxes)
 
         # Desenha as marcações e linhas
-        img_with_boxes = draw_matches(img, matched_data)
+        img_with_boxes = draw_matches(Image.fromarray(gray), matched_data)
 
         # Mostra a imagem com as marcações
         img_with_boxes.show()
@@ -5,13 +5,59 @@ import re
 import PyPDF2
 import pytesseract
 from pdf2image import convert_from_path
+from pdf2image.exceptions import PDFPopplerTimeoutError
 import json
 import os
+import time
+import signal
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import deque
 from PIL import Image, ImageDraw
 import uuid
 
-# 
-def process_region(img, coords, is_numeric=False, custom_config=None, debug=False, debug_path=None, region_name=""):
+# Configurações de OCR usadas quando o arquivo de coordenadas não traz a chave "ocr"
+DEFAULT_OCR_SETTINGS = {
+    'dpi': 400,
+    'texto': {'config': r'--oem 3 --psm 6 -l por+eng', 'threshold': 150},
+    'notas': {'config': r'--oem 3 --psm 6 -l por+eng', 'threshold': 150},
+}
+
+STUDENT_PATTERNS = {
+    'Escola': r'ESCOLA:\s\d+\s-\s(.+?)\sMUN[ÍI]C[ÍI]PIO:',
+    'INEP Escola': r'ESCOLA:\s(\d+)',
+    'CREDE': r'CREDE\s(\d+)',
+    'Municipio': r'MUN[ÍI]C[ÍI]PIO:\s([A-ZÀ-ÜÇ]+(?:[\s-][A-ZÀ-ÜÇ]+)*)(?=\s|$)',
+    'Ano Letivo': r'(?:ANO|ANO\s+LETIVO)\s+(\d{4})',
+    'Aluno(a)': r'ALUNO\(A\):\s*([A-ZÀ-ÜÇ\s]+?)\s*(?:NASCIMENTO|$)',
+    'Matrícula': r'MATR[ÍI]CULA:\s*(\d+)',
+}
+
+
+def get_ocr_settings(coordinates_json=None):
+    """Combina as configurações de OCR do arquivo de coordenadas (chave "ocr") com os valores padrão"""
+    ocr = (coordinates_json or {}).get('ocr', {})
+    settings = {
+        'dpi': ocr.get('dpi', DEFAULT_OCR_SETTINGS['dpi']),
+        'texto': {**DEFAULT_OCR_SETTINGS['texto'], **ocr.get('texto', {})},
+        'notas': {**DEFAULT_OCR_SETTINGS['notas'], **ocr.get('notas', {})},
+    }
+
+    # Escolha própria do OCR empilhado (tune_ocr.py --empilhar); sem ela, usa a do OCR por página
+    stacked = ocr.get('empilhado', {})
+    settings['empilhado'] = {field: {**settings[field], **stacked.get(field, {})} for field in ('texto', 'notas')}
+    return settings
+
+
+def is_timeout_error(error):
+    """Indica se o erro foi um tempo limite do Tesseract ou do poppler"""
+    if isinstance(error, PDFPopplerTimeoutError):
+        return True
+    return isinstance(error, RuntimeError) and str(error) == 'Tesseract process timeout'
+
+
+def process_region(img, coords, is_numeric=False, custom_config=None, debug=False, debug_path=None, region_name="",
+                   threshold=150, timeout=0):
     """Função independente para processar regiões de imagem"""
     try:
         region_img = img.crop(coords)
@@ -20,130 +66,167 @@ def process_region(img, coords, is_numeric=False, custom_config=None, debug=Fals
             region_img.save(os.path.join(debug_path, f"region_{region_name}.png"))
 
         region_img = region_img.convert('L')  # Converter para escala de cinza
-        threshold = 150
         region_img = region_img.point(lambda p: p > threshold and 255)
 
         if debug and debug_path:
             region_img.save(os.path.join(debug_path, f"processed_{region_name}.png"))
 
-        text = pytesseract.image_to_string(region_img, config=custom_config)
+        text = pytesseract.image_to_string(region_img, config=custom_config, timeout=timeout)
         cleaned = ' '.join(text.strip().split())
 
         if is_numeric:
-            numbers = re.findall(r'\d+[\.,]?\d*', cleaned)
-            if numbers:
-                return numbers[0].replace(',', '.')
-            return 'N/A'
+            return parse_numeric(cleaned)
 
         return cleaned
     except Exception as e:
+        # Tempo limite interrompe a página inteira para que ela seja refeita
+        if is_timeout_error(e):
+            raise
         print(f"Erro ao processar região: {e}")
         return 'N/A'
 
 
-def extract_grades(img, width, height, custom_config, coordinates_json, debug=False, debug_path=None):
+def parse_numeric(cleaned):
+    """Retorna o primeiro número do texto (com ponto decimal) ou 'N/A'"""
+    numbers = re.findall(r'\d+[\.,]?\d*', cleaned)
+    if numbers:
+        return numbers[0].replace(',', '.')
+    return 'N/A'
+
+
+def grade_regions(width, height, coordinates_json):
+    """Calcula as coordenadas absolutas da nota de cada disciplina a partir do JSON"""
+    regions = []
+    for disciplina, notas in coordinates_json.get("notas_por_disciplina", {}).items():
+        if notas and len(notas) > 0:
+            coord_data = notas[0]  # Pega o primeiro item (ignorando o campo "nota")
+
+            # Cálculo modificado para corresponder ao script de captura
+            x_center = coord_data["x"] * width
+            y_center = coord_data["y"] * height
+            half_width = (coord_data["largura"] * width) / 2
+            half_height = (coord_data["altura"] * height) / 2
+
+            # Calcula coordenadas absolutas
+            x0 = int(x_center - half_width)
+            y0 = int(y_center - half_height)
+            x1 = int(x_center + half_width)
+            y1 = int(y_center + half_height)
+
+            regions.append((disciplina.strip(), (x0, y0, x1, y1)))
+
+    return regions
+
+
+def header_regions(width, height):
+    """Coordenadas do cabeçalho e dos dados do aluno (mantidas como no original)"""
+    header_coords = (int(width * 0.50), 0, width, int(height * 0.10))
+    student_data_coords = (0, int(height * 0.11), width, int(height * 0.19))
+    return header_coords, student_data_coords
+
+
+def extract_grades(img, width, height, custom_config, coordinates_json, debug=False, debug_path=None, threshold=150,
+                   timeout=0):
     """Extrai as notas das disciplinas usando coordenadas do JSON"""
     try:
-        notas_coords = coordinates_json.get("notas_por_disciplina", {})
         grades = {}
 
-        for disciplina, notas in notas_coords.items():
-            if notas and len(notas) > 0:
-                coord_data = notas[0]  # Pega o primeiro item (ignorando o campo "nota")
-
-                # Cálculo modificado para corresponder ao script de captura
-                x_center = coord_data["x"] * width
-                y_center = coord_data["y"] * height
-                half_width = (coord_data["largura"] * width) / 2
-                half_height = (coord_data["altura"] * height) / 2
-
-                # Calcula coordenadas absolutas
-                x0 = int(x_center - half_width)
-                y0 = int(y_center - half_height)
-                x1 = int(x_center + half_width)
-                y1 = int(y_center + half_height)
-
-                coords = (x0, y0, x1, y1)
-                region_id = f"nota_{disciplina.strip().lower().replace(' ', '_')}"
-
-                grade = process_region(
-                    img,
-                    coords,
-                    is_numeric=True,
-                    custom_config=custom_config,
-                    debug=debug,
-                    debug_path=debug_path,
-                    region_name=region_id
-                )
-                grades[disciplina.strip()] = grade
+        for disciplina, coords in grade_regions(width, height, coordinates_json):
+            region_id = f"nota_{disciplina.lower().replace(' ', '_')}"
 
-                if debug and debug_path:
-                    debug_img = img.copy()
-                    draw = ImageDraw.Draw(debug_img)
-                    draw.rectangle(coords, outline="red", width=3)
-                    debug_img.save(os.path.join(debug_path, f"marked_{region_id}.png"))
+            grade = process_region(
+                img,
+                coords,
+                is_numeric=True,
+                custom_config=custom_config,
+                debug=debug,
+                debug_path=debug_path,
+                region_name=region_id,
+                threshold=threshold,
+                timeout=timeout
+            )
+            grades[disciplina] = grade
+
+            if debug and debug_path:
+                debug_img = img.copy()
+                draw = ImageDraw.Draw(debug_img)
+                draw.rectangle(coords, outline="red", width=3)
+                debug_img.save(os.path.join(debug_path, f"marked_{region_id}.png"))
 
         return grades
     except Exception as e:
+        if is_timeout_error(e):
+            raise
         print(f"Erro ao extrair notas: {e}")
         return {}
 
 
-def extract_student_data(img, coordinates_json=None, debug=False, debug_path=None):
+def parse_student_text(combined_text):
+    """Extrai os campos do aluno do texto do cabeçalho e dos dados do aluno"""
+    data = {}
+    for field, pattern in STUDENT_PATTERNS.items():
+        match = re.search(pattern, combined_text, re.IGNORECASE)
+        data[field] = match.group(1).strip() if match else 'N/A'
+
+    return data
+
+
+def extract_header_data(img, custom_config, threshold=150, debug=False, debug_path=None, timeout=0):
+    """Lê o cabeçalho e os dados do aluno e extrai os campos de texto"""
+    header_coords, student_data_coords = header_regions(*img.size)
+
+    header_text = process_region(
+        img,
+        header_coords,
+        custom_config=custom_config,
+        debug=debug,
+        debug_path=debug_path,
+        region_name="header",
+        threshold=threshold,
+        timeout=timeout
+    )
+
+    student_text = process_region(
+        img,
+        student_data_coords,
+        custom_config=custom_config,
+        debug=debug,
+        debug_path=debug_path,
+        region_name="student_data",
+        threshold=threshold,
+        timeout=timeout
+    )
+
+    return parse_student_text(f"{header_text} {student_text}")
+
+
+def extract_student_data(img, coordinates_json=None, debug=False, debug_path=None, timeout=0):
     """Extrai dados do aluno de uma única imagem de página"""
     try:
         width, height = img.size
-        custom_config = r'--oem 3 --psm 6 -l por+eng'
+        settings = get_ocr_settings(coordinates_json)
 
-        # Coordenadas das regiões de interesse (mantidas como no original)
-        header_coords = (int(width * 0.50), 0, width, int(height * 0.10))
-        student_data_coords = (0, int(height * 0.11), width, int(height * 0.19))
-
-        header_text = process_region(
+        data = extract_header_data(
             img,
-            header_coords,
-            custom_config=custom_config,
+            settings['texto']['config'],
+            threshold=settings['texto']['threshold'],
             debug=debug,
             debug_path=debug_path,
-            region_name="header"
+            timeout=timeout
         )
 
-        student_text = process_region(
-            img,
-            student_data_coords,
-            custom_config=custom_config,
-            debug=debug,
-            debug_path=debug_path,
-            region_name="student_data"
-        )
-
-        combined_text = f"{header_text} {student_text}"
-
-        patterns = {
-            'Escola': r'ESCOLA:\s\d+\s-\s(.+?)\sMUN[ÍI]C[ÍI]PIO:',
-            'INEP Escola': r'ESCOLA:\s(\d+)',
-            'CREDE': r'CREDE\s(\d+)',
-            'Municipio': r'MUN[ÍI]C[ÍI]PIO:\s([A-ZÀ-ÜÇ]+(?:[\s-][A-ZÀ-ÜÇ]+)*)(?=\s|$)',
-            'Ano Letivo': r'(?:ANO|ANO\s+LETIVO)\s+(\d{4})',
-            'Aluno(a)': r'ALUNO\(A\):\s*([A-ZÀ-ÜÇ\s]+?)\s*(?:NASCIMENTO|$)',
-            'Matrícula': r'MATR[ÍI]CULA:\s*(\d+)',
-        }
-
-        data = {}
-        for field, pattern in patterns.items():
-            match = re.search(pattern, combined_text, re.IGNORECASE)
-            data[field] = match.group(1).strip() if match else 'N/A'
-
         # Extrai notas usando as coordenadas do JSON
         if coordinates_json:
             data['Disciplinas'] = extract_grades(
                 img,
                 width,
                 height,
-                custom_config,
+                settings['notas']['config'],
                 coordinates_json,
                 debug=debug,
-                debug_path=debug_path
+                debug_path=debug_path,
+                threshold=settings['notas']['threshold'],
+                timeout=timeout
             )
         else:
             data['Disciplinas'] = {}
@@ -151,10 +234,173 @@ def extract_student_data(img, coordinates_json=None, debug=False, debug_path=Non
         return data
 
     except Exception as e:
+        if is_timeout_error(e):
+            raise
         print(f"Erro ao extrair dados da página: {e}")
         return {"error": str(e)}
 
 
+def stack_config(custom_config):
+    """Adapta a configuração ao OCR empilhado: modos de linha/palavra única viram bloco uniforme (--psm 6)"""
+    return re.sub(r'--psm\s+(7|8|10|13)\b', '--psm 6', custom_config or '')
+
+
+def check_stack_settings(coordinates_json=None):
+    """Avisa quando o OCR empilhado usaria uma configuração do tune_ocr.py medida apenas página a página"""
+    ocr = (coordinates_json or {}).get('ocr')
+    if not ocr or 'empilhado' in ocr:
+        return
+
+    settings = get_ocr_settings(coordinates_json)
+    print("\n⚠️ Aviso: a configuração de OCR do arquivo de coordenadas foi medida página a página; a acurácia e a "
+          "latência gravadas não valem para o OCR empilhado. Rode tune_ocr.py com --empilhar N para medi-lo")
+    for field in ('texto', 'notas'):
+        config = settings['empilhado'][field]['config']
+        if stack_config(config) != config:
+            print(f"   {field}: '{config}' será lido como '{stack_config(config)}' nas pilhas")
+
+
+def binarize_region(img, coords, threshold=150):
+    """Recorta e binariza uma região como em process_region, guardando-a com 1 bit por pixel"""
+    return img.crop(coords).convert('L').point(lambda p: 255 if p > threshold else 0, mode='1')
+
+
+def crop_page_regions(img, coordinates_json=None):
+    """Recorta as regiões do modelo de uma página para o OCR empilhado, permitindo descartar a página inteira"""
+    settings = get_ocr_settings(coordinates_json)['empilhado']
+    header_coords, student_data_coords = header_regions(*img.size)
+
+    page_crops = {
+        'texto': [binarize_region(img, header_coords, settings['texto']['threshold']),
+                  binarize_region(img, student_data_coords, settings['texto']['threshold'])],
+        'notas': []
+    }
+
+    if coordinates_json:
+        for disciplina, coords in grade_regions(*img.size, coordinates_json):
+            page_crops['notas'].append((disciplina, binarize_region(img, coords, settings['notas']['threshold'])))
+
+    return page_crops
+
+
+def ocr_stacked(crops, custom_config, gap=30, max_height=30000, debug_path=None, stack_name="stack", timeout=0):
+    """Empilha regiões já binarizadas de várias páginas em imagens altas e lê cada pilha com um único OCR"""
+    texts = [[] for _ in crops]
+
+    # Divide em pilhas que respeitam a altura máxima aceita pelo Tesseract
+    stacks = []
+    current = []
+    current_height = gap
+    for index, crop in enumerate(crops):
+        if current and current_height + crop.height + gap > max_height:
+            stacks.append(current)
+            current = []
+            current_height = gap
+        current.append(index)
+        current_height += crop.height + gap
+    if current:
+        stacks.append(current)
+
+    config = stack_config(custom_config)
+    for stack_number, indexes in enumerate(stacks):
+        stack_width = max(crops[i].width for i in indexes)
+        stack_height = gap + sum(crops[i].height + gap for i in indexes)
+        stack_img = Image.new('L', (stack_width, stack_height), 255)
+
+        # Faixa vertical (início, fim) de cada região dentro da pilha
+        bands = []
+        y = gap
+        for i in indexes:
+            stack_img.paste(crops[i], (0, y))
+            bands.append((y, y + crops[i].height, i))
+            y += crops[i].height + gap
+
+        if debug_path:
+            stack_img.save(os.path.join(debug_path, f"{stack_name}_{stack_number}.png"))
+
+        # O tempo limite de uma pilha cresce com o número de regiões empilhadas
+        data = pytesseract.image_to_data(stack_img, config=config, output_type=pytesseract.Output.DICT,
+                                         timeout=timeout * len(indexes))
+
+        # Devolve cada palavra à região de origem pelo centro vertical
+        for k, word in enumerate(data['text']):
+            word = word.strip()
+            if not word:
+                continue
+
+            center_y = data['top'][k] + data['height'][k] / 2
+            for start, end, i in bands:
+                if start <= center_y < end:
+                    order = (data['block_num'][k], data['par_num'][k], data['line_num'][k], data['word_num'][k])
+                    texts[i].append((order, word))
+                    break
+
+    return [' '.join(word for _, word in sorted(words)) for words in texts]
+
+
+def read_text_stacked(page_crops, custom_config, debug_path=None, timeout=0):
+    """Lê o cabeçalho e os dados do aluno de várias páginas em um único OCR e extrai os campos de texto"""
+    texts = ocr_stacked(
+        [crop for crops in page_crops for crop in crops['texto']],
+        custom_config,
+        debug_path=debug_path,
+        stack_name="stack_texto",
+        timeout=timeout
+    )
+
+    return [parse_student_text(f"{texts[2 * i]} {texts[2 * i + 1]}") for i in range(len(page_crops))]
+
+
+def read_grades_stacked(page_crops, custom_config, debug_path=None, timeout=0):
+    """Lê as células de nota de todas as disciplinas de várias páginas em um único OCR"""
+    grade_cells = []
+    owners = []
+    for page_index, crops in enumerate(page_crops):
+        for disciplina, crop in crops['notas']:
+            grade_cells.append(crop)
+            owners.append((page_index, disciplina))
+
+    grade_texts = ocr_stacked(
+        grade_cells,
+        custom_config,
+        debug_path=debug_path,
+        stack_name="stack_notas",
+        timeout=timeout
+    )
+
+    grades = [{} for _ in page_crops]
+    for (page_index, disciplina), text in zip(owners, grade_texts):
+        grades[page_index][disciplina] = parse_numeric(text)
+
+    return grades
+
+
+def extract_student_data_stacked(page_crops, coordinates_json=None, debug_path=None, timeout=0):
+    """Extrai dados de várias páginas (recortes de crop_page_regions) lendo cada tipo de região em um único OCR"""
+    settings = get_ocr_settings(coordinates_json)['empilhado']
+
+    all_data = read_text_stacked(page_crops, settings['texto']['config'], debug_path, timeout)
+    grades = read_grades_stacked(page_crops, settings['notas']['config'], debug_path, timeout)
+    for data, page_grades in zip(all_data, grades):
+        data['Disciplinas'] = page_grades
+
+    return all_data
+
+
+def render_pages(pdf_path, first_page, last_page, dpi, timeout=None):
+    """Converte um intervalo de páginas (1-based) com as mesmas opções em toda a aplicação"""
+    return convert_from_path(
+        pdf_path,
+        first_page=first_page,
+        last_page=last_page,
+        dpi=dpi,
+        thread_count=2,
+        poppler_path='/usr/bin',
+        fmt='jpeg',
+        timeout=timeout
+    )
+
+
 def get_pdf_page_count(pdf_path):
     """Método mais confiável para contar páginas do PDF"""
     try:
@@ -166,7 +412,150 @@ def get_pdf_page_count(pdf_path):
         return 0
 
 
-def process_pdf(pdf_path, output_file, coordinates_json=None, batch_size=3, debug=False, debug_path=None):
+def extract_page(img, current_page, coordinates_json, ocr_timeout, debug=False, debug_path=None):
+    """Extrai os dados de uma página já convertida, registrando falhas como {"error": ...}"""
+    print(f"\nProcessando página {current_page}...")
+
+    try:
+        # Cria subpasta para debug da página atual se necessário
+        page_debug_path = None
+        if debug and debug_path:
+            page_debug_path = os.path.join(debug_path, f"page_{current_page}")
+            os.makedirs(page_debug_path, exist_ok=True)
+
+        # Salva imagem completa da página se debug ativado
+        if debug and page_debug_path:
+            img.save(os.path.join(page_debug_path, "full_page.png"))
+
+        student_data = extract_student_data(
+            img,
+            coordinates_json,
+            debug=debug,
+            debug_path=page_debug_path,
+            timeout=ocr_timeout
+        )
+
+        if student_data:
+            print(f"✅ Dados extraídos: {student_data.get('Aluno(a)', 'N/A')}")
+            return student_data
+
+        print("❌ Falha ao extrair dados")
+        return {"error": f"Falha na página {current_page}"}
+    except Exception as page_error:
+        # Tempo limite de OCR: o watchdog refaz a página com configurações mais leves
+        if is_timeout_error(page_error):
+            raise
+        print(f"Erro na página {current_page}: {str(page_error)}")
+        return {"error": f"Erro na página {current_page}: {str(page_error)}"}
+
+
+def process_page_range(conn, pdf_path, first_page, last_page, coordinates_json, dpi, stack, batch_size,
+                       render_timeout, ocr_timeout, debug=False, debug_path=None):
+    """Processo de trabalho: converte e extrai um intervalo de páginas, enviando cada página pelo pipe ao terminá-la"""
+    # Grupo de processos próprio para que o watchdog encerre também o Tesseract e o poppler
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+    try:
+        if not stack:
+            print(f"\nConvertendo páginas {first_page} a {last_page} ({dpi} DPI)...")
+            images = render_pages(pdf_path, first_page, last_page, dpi, timeout=render_timeout)
+            print(f"Convertidas {len(images)} imagens para processamento")
+
+            for i, img in enumerate(images):
+                page = first_page + i
+                conn.send(('pagina', page, extract_page(img, page, coordinates_json, ocr_timeout, debug, debug_path)))
+
+            conn.send(('fim', None))
+            return
+
+        # OCR empilhado: converte em lotes de batch_size e guarda só os recortes das regiões do modelo
+        page_crops = []
+        for batch_start in range(first_page, last_page + 1, batch_size):
+            batch_end = min(batch_start + batch_size - 1, last_page)
+            print(f"\nConvertendo páginas {batch_start} a {batch_end} ({dpi} DPI)...")
+            images = render_pages(pdf_path, batch_start, batch_end, dpi, timeout=render_timeout)
+
+            for i, img in enumerate(images):
+                if debug and debug_path:
+                    page_debug_path = os.path.join(debug_path, f"page_{batch_start + i}")
+                    os.makedirs(page_debug_path, exist_ok=True)
+                    img.save(os.path.join(page_debug_path, "full_page.png"))
+                page_crops.append(crop_page_regions(img, coordinates_json))
+
+            del images  # Libera as páginas inteiras antes de converter o próximo lote
+
+        try:
+            stack_debug_path = None
+            if debug and debug_path:
+                stack_debug_path = os.path.join(debug_path, f"pilha_{first_page}-{last_page}")
+                os.makedirs(stack_debug_path, exist_ok=True)
+
+            print(f"\nOCR empilhado das páginas {first_page} a {last_page}...")
+            results = extract_student_data_stacked(page_crops, coordinates_json, debug_path=stack_debug_path,
+                                                   timeout=ocr_timeout)
+        except Exception as stack_error:
+            if is_timeout_error(stack_error):
+                raise
+
+            # Reconverte página a página, já que as páginas inteiras foram descartadas
+            print(f"Erro no OCR empilhado, processando página a página: {stack_error}")
+            for page in range(first_page, first_page + len(page_crops)):
+                img = render_pages(pdf_path, page, page, dpi, timeout=render_timeout)[0]
+                conn.send(('pagina', page, extract_page(img, page, coordinates_json, ocr_timeout, debug, debug_path)))
+        else:
+            for i, student_data in enumerate(results):
+                print(f"✅ Página {first_page + i}: {student_data.get('Aluno(a)', 'N/A')}")
+                conn.send(('pagina', first_page + i, student_data))
+
+        conn.send(('fim', None))
+    except Exception as e:
+        conn.send(('erro', str(e) or type(e).__name__))
+    finally:
+        conn.close()
+
+
+def start_worker(task, pdf_path, coordinates_json, dpi, stack, batch_size, page_timeout, render_timeout, ocr_timeout,
+                 debug, debug_path):
+    """Inicia um processo de trabalho para a tarefa (primeira página, última página, tentativa)"""
+    first_page, last_page, attempt = task
+
+    # Nova tentativa: resolução menor e sem empilhamento
+    if attempt > 0:
+        dpi = max(150, int(dpi * 0.75))
+        stack = 0
+
+    recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=process_page_range,
+        args=(send_conn, pdf_path, first_page, last_page, coordinates_json, dpi, stack, batch_size,
+              render_timeout, ocr_timeout, debug, debug_path),
+        daemon=True
+    )
+    process.start()
+    send_conn.close()  # O pai só lê; assim a morte do processo aparece como EOF
+
+    n_pages = last_page - first_page + 1
+    deadline = time.monotonic() + page_timeout * n_pages if page_timeout else float('inf')
+    # next_page: primeira página do intervalo ainda sem resultado (as páginas chegam em ordem)
+    return {'task': task, 'process': process, 'conn': recv_conn, 'deadline': deadline, 'next_page': first_page}
+
+
+def stop_worker(worker):
+    """Encerra um processo de trabalho e os processos do Tesseract/poppler iniciados por ele"""
+    process = worker['process']
+    if process.is_alive():
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            pass
+        process.kill()
+    process.join()
+    worker['conn'].close()
+
+
+def process_pdf(pdf_path, output_file, coordinates_json=None, batch_size=3, debug=False, debug_path=None,
+                stack=0, workers=1, page_timeout=300, render_timeout=120, ocr_timeout=60):
     """Processa todas as páginas do PDF corretamente"""
     total_pages = get_pdf_page_count(pdf_path)
     if total_pages == 0:
@@ -175,71 +564,87 @@ def process_pdf(pdf_path, output_file, coordinates_json=None, batch_size=3, debu
 
     print(f"PDF contém {total_pages} páginas confirmadas")
 
-    all_data = []
-    processed_pages = 0
-
-    while processed_pages < total_pages:
-        start_page = processed_pages + 1
-        end_page = min(processed_pages + batch_size, total_pages)
-
-        print(f"\nConvertendo páginas {start_page} a {end_page}...")
-        try:
-            images = convert_from_path(
-                pdf_path,
-                first_page=start_page,
-                last_page=end_page,
-                dpi=400,
-                thread_count=2,
-                poppler_path='/usr/bin',
-                fmt='jpeg'
-            )
+    dpi = get_ocr_settings(coordinates_json)['dpi']
+    if stack:
+        check_stack_settings(coordinates_json)
 
-            print(f"Convertidas {len(images)} imagens para processamento")
+    # Tarefas: (primeira página, última página, tentativa); com OCR empilhado, cada tarefa é uma pilha de páginas
+    task_size = stack if stack else batch_size
+    pending = deque((start, min(start + task_size - 1, total_pages), 0)
+                    for start in range(1, total_pages + 1, task_size))
+    running = []
+    results = {}
+    failed = False
 
-            for i, img in enumerate(images):
-                current_page = processed_pages + i + 1
-                print(f"\nProcessando página {current_page}/{total_pages}...")
-
-                try:
-                    # Cria subpasta para debug da página atual se necessário
-                    page_debug_path = None
-                    if debug and debug_path:
-                        page_debug_path = os.path.join(debug_path, f"page_{current_page}")
-                        os.makedirs(page_debug_path, exist_ok=True)
-
-                    # Salva imagem completa da página se debug ativado
-                    if debug and page_debug_path:
-                        img.save(os.path.join(page_debug_path, "full_page.png"))
-
-                    student_data = extract_student_data(
-                        img,
-                        coordinates_json,
-                        debug=debug,
-                        debug_path=page_debug_path
-                    )
-
-                    if student_data:
-                        all_data.append(student_data)
-                        print(f"✅ Dados extraídos: {student_data.get('Aluno(a)', 'N/A')}")
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                running.append(start_worker(pending.popleft(), pdf_path, coordinates_json, dpi, stack, batch_size,
+                                            page_timeout, render_timeout or None, ocr_timeout or 0, debug,
+                                            debug_path))
+
+            # Watchdog: espera resultados até o prazo mais próximo
+            next_deadline = min(worker['deadline'] for worker in running)
+            ready = wait([worker['conn'] for worker in running],
+                         timeout=min(1.0, max(0.0, next_deadline - time.monotonic())))
+
+            now = time.monotonic()
+            for worker in list(running):
+                status, payload = None, None
+                if worker['conn'] in ready:
+                    # Guarda as páginas já concluídas antes de olhar o estado do processo
+                    try:
+                        while worker['conn'].poll():
+                            message = worker['conn'].recv()
+                            if message[0] != 'pagina':
+                                status, payload = message
+                                break
+                            _, page, data = message
+                            results[page] = data
+                            worker['next_page'] = page + 1
+                    except (EOFError, OSError):
+                        status, payload = 'erro', "processo de trabalho encerrado inesperadamente"
+                elif now > worker['deadline']:
+                    status, payload = 'erro', "tempo limite da página excedido"
+
+                if status is not None:
+                    stop_worker(worker)
+                    running.remove(worker)
+                    _, last_page, attempt = worker['task']
+                    next_page = worker['next_page']
+
+                    # Processo encerrado normalmente, mas sem enviar todas as páginas: refaz as que faltam
+                    if status == 'fim':
+                        payload = "página não convertida"
+
+                    if next_page > last_page:
+                        # Todas as páginas chegaram antes do encerramento ou do prazo
+                        pass
+                    elif next_page < last_page:
+                        # Conversão em lote e pilhas falham juntas: as páginas sem resultado voltam à fila,
+                        # uma por tarefa e com as configurações normais, para isolar a página problemática
+                        print(f"\n⚠️ Páginas {next_page}-{last_page}: {payload}. Refazendo página a página...")
+                        pending.extend((page, page, 0) for page in range(next_page, last_page + 1))
+                    elif attempt == 0:
+                        print(f"\n⚠️ Página {next_page}: {payload}. Nova tentativa com configurações mais leves...")
+                        pending.append((next_page, next_page, 1))
                     else:
-                        all_data.append({"error": f"Falha na página {current_page}"})
-                        print("❌ Falha ao extrair dados")
-                except Exception as page_error:
-                    print(f"Erro na página {current_page}: {str(page_error)}")
-                    all_data.append({"error": f"Erro na página {current_page}: {str(page_error)}"})
+                        print(f"\n❌ Página {next_page}: {payload} (nova tentativa também falhou)")
+                        failed = True
+                        results[next_page] = {"error": f"Erro na página {next_page}: {payload}"}
 
-                # Salvar progresso após cada página
-                with open(output_file, 'w') as f:
-                    json.dump(all_data, f, indent=2, ensure_ascii=False)
+                # Salvar progresso após cada página recebida
+                if worker['conn'] in ready or status is not None:
+                    with open(output_file, 'w') as f:
+                        json.dump([results[page] for page in sorted(results)], f, indent=2, ensure_ascii=False)
 
-            processed_pages += len(images)
+    finally:
+        for worker in running:
+            stop_worker(worker)
 
-        except Exception as batch_error:
-            print(f"\nErro no lote de páginas {start_page}-{end_page}: {batch_error}")
-            print("Salvando progresso atual...")
-            with open(output_file, 'w') as f:
-                json.dump(all_data, f, indent=2, ensure_ascii=False)
-            return False
+    if failed:
+        print("\nProcessamento concluído com páginas que falharam mesmo após nova tentativa")
+        return False
 
     print("\nProcessamento concluído com sucesso!")
     return True
@@ -256,6 +661,17 @@ def main():
     parser.add_argument('-d', '--debug', action='store_true', help='Ativa modo debug (salva imagens processadas)')
     parser.add_argument('--debug-path', default="debug_output",
                         help='Pasta para salvar arquivos de debug (padrão: debug_output)')
+    parser.add_argument('-e', '--stack', type=int, default=0, metavar='N',
+                        help='OCR empilhado: lê a mesma região de N páginas em uma única chamada, '
+                             'independente do tamanho do lote de conversão (padrão: 0, desativado)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Número de processos de trabalho em paralelo (padrão: 1)')
+    parser.add_argument('--page-timeout', type=float, default=300,
+                        help='Prazo por página em segundos, vigiado pelo watchdog (padrão: 300; 0 desativa)')
+    parser.add_argument('--render-timeout', type=float, default=120,
+                        help='Prazo da conversão de cada lote pelo poppler em segundos (padrão: 120; 0 desativa)')
+    parser.add_argument('--ocr-timeout', type=float, default=60,
+                        help='Prazo de cada chamada ao Tesseract em segundos (padrão: 60; 0 desativa)')
     args = parser.parse_args()
 
     print(f"\nIniciando processamento de {args.pdf_path}")
@@ -290,7 +706,12 @@ def main():
         coordinates_json,
         args.batch,
         debug=args.debug,
-        debug_path=args.debug_path
+        debug_path=args.debug_path,
+        stack=max(0, args.stack),
+        workers=max(1, args.workers),
+        page_timeout=args.page_timeout,
+        render_timeout=args.render_timeout,
+        ocr_timeout=args.ocr_timeout
     )
 
     if success:
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import argparse
+import itertools
+
+from get_grades import (extract_header_data, extract_grades, get_ocr_settings, render_pages, crop_page_regions,
+                        read_text_stacked, read_grades_stacked, stack_config, STUDENT_PATTERNS)
+
+GRADE_WHITELIST = '0123456789.,'
+
+
+def load_labels(labels_path):
+    """Carrega o conjunto rotulado: {"pdf": ..., "paginas": [{"pagina": 1, "Aluno(a)": ..., "Disciplinas": {...}}]}"""
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    if not labels.get('pdf') or not labels.get('paginas'):
+        raise ValueError("O arquivo de rótulos precisa das chaves 'pdf' e 'paginas'")
+
+    return labels
+
+
+def render_labeled_pages(pdf_path, pages, dpi):
+    """Converte as páginas rotuladas como em get_grades.py e mede o tempo médio por página"""
+    images = []
+    start = time.perf_counter()
+    for page in pages:
+        rendered = render_pages(pdf_path, page['pagina'], page['pagina'], dpi)
+        if not rendered:
+            raise ValueError(f"Página {page['pagina']} não encontrada no PDF")
+        images.append(rendered[0])
+
+    return images, (time.perf_counter() - start) / len(pages)
+
+
+def normalize_text(value):
+    """Normaliza um valor de texto para comparação"""
+    return ' '.join(str(value).split()).casefold()
+
+
+def normalize_grade(value):
+    """Normaliza uma nota para comparação ('6,0', '6.0' e '6' são equivalentes)"""
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return normalize_text(value)
+
+
+def build_config(oem, psm, lang, whitelist=None):
+    """Monta a string de configuração do Tesseract"""
+    config = f'--oem {oem} --psm {psm} -l {lang}'
+    if whitelist:
+        config += f' -c tessedit_char_whitelist={whitelist}'
+    return config
+
+
+def score_text(extracted, pages):
+    """Calcula a acurácia dos campos de texto extraídos em relação aos rótulos"""
+    correct = total = 0
+    for data, page in zip(extracted, pages):
+        for field in STUDENT_PATTERNS:
+            if field in page:
+                total += 1
+                correct += normalize_text(data[field]) == normalize_text(page[field])
+
+    return correct / total if total else 0.0
+
+
+def score_grades(extracted, pages):
+    """Calcula a acurácia das notas extraídas em relação aos rótulos"""
+    correct = total = 0
+    for grades, page in zip(extracted, pages):
+        for subject, expected in page.get('Disciplinas', {}).items():
+            total += 1
+            correct += normalize_grade(grades.get(subject.strip(), 'N/A')) == normalize_grade(expected)
+
+    return correct / total if total else 0.0
+
+
+def evaluate_text(images, pages, config, threshold):
+    """Mede acurácia e latência média por página dos campos de texto do aluno"""
+    start = time.perf_counter()
+    extracted = [extract_header_data(img, config, threshold=threshold) for img in images]
+    latency = (time.perf_counter() - start) / len(images)
+    return score_text(extracted, pages), latency
+
+
+def evaluate_grades(images, pages, config, threshold, coordinates_json):
+    """Mede acurácia e latência média por página das notas das disciplinas"""
+    start = time.perf_counter()
+    extracted = [extract_grades(img, *img.size, config, coordinates_json, threshold=threshold) for img in images]
+    latency = (time.perf_counter() - start) / len(images)
+    return score_grades(extracted, pages), latency
+
+
+def crop_labeled_pages(images, coordinates_json, threshold):
+    """Recorta e binariza as regiões das páginas rotuladas como o OCR empilhado, com o limiar testado"""
+    stacked = {'texto': {'threshold': threshold}, 'notas': {'threshold': threshold}}
+    coordinates = dict(coordinates_json, ocr=dict(coordinates_json.get('ocr', {}), empilhado=stacked))
+    return [crop_page_regions(img, coordinates) for img in images]
+
+
+def evaluate_stacked(page_crops, pages, config, stack_size, read, score):
+    """Mede acurácia e latência média por página de um campo lido em pilhas de stack_size páginas"""
+    start = time.perf_counter()
+    extracted = []
+    for first in range(0, len(page_crops), stack_size):
+        extracted.extend(read(page_crops[first:first + stack_size], config))
+    latency = (time.perf_counter() - start) / len(page_crops)
+    return score(extracted, pages), latency
+
+
+def pareto_front(results):
+    """Filtra as medições não dominadas (maior acurácia e menor latência)"""
+    front = []
+    for candidate in results:
+        dominated = any(
+            other['acuracia'] >= candidate['acuracia'] and other['latencia'] <= candidate['latencia'] and
+            (other['acuracia'] > candidate['acuracia'] or other['latencia'] < candidate['latencia'])
+            for other in results
+        )
+        if not dominated:
+            front.append(candidate)
+
+    return sorted(front, key=lambda r: r['latencia'])
+
+
+def pick_fastest(front, target):
+    """Escolhe o ponto mais rápido da fronteira que atinge a acurácia alvo (ou o mais preciso, se nenhum atingir)"""
+    eligible = [r for r in front if r['acuracia'] >= target]
+    if eligible:
+        return min(eligible, key=lambda r: r['latencia'])
+    return max(front, key=lambda r: (r['acuracia'], -r['latencia']))
+
+
+def sweep(labels, coordinates_json, dpis, oems, text_psms, grade_psms, langs, whitelists, thresholds, stack_size=0):
+    """Executa a varredura de configurações para cada resolução e tipo de campo (e, com stack_size, no OCR empilhado)"""
+    pages = labels['paginas']
+    measurements = []
+
+    for dpi in dpis:
+        print(f"\nConvertendo {len(pages)} páginas rotuladas a {dpi} DPI...")
+        images, render_time = render_labeled_pages(labels['pdf'], pages, dpi)
+        measurements.append({'campo': 'renderizacao', 'dpi': dpi, 'latencia': render_time})
+
+        # Cabeçalho e dados do aluno são blocos de várias linhas: só modos de bloco fazem sentido
+        for oem, psm, lang, threshold in itertools.product(oems, text_psms, langs, thresholds):
+            config = build_config(oem, psm, lang)
+            accuracy, latency = evaluate_text(images, pages, config, threshold)
+            measurements.append({'campo': 'texto', 'dpi': dpi, 'config': config, 'threshold': threshold,
+                                  'acuracia': accuracy, 'latencia': latency})
+            print(f"[texto] {dpi} DPI | {config} | threshold {threshold} | "
+                  f"acurácia {accuracy:.3f} | {latency:.2f}s/página")
+
+        for oem, psm, lang, whitelist, threshold in itertools.product(oems, grade_psms, langs, whitelists,
+                                                                      thresholds):
+            config = build_config(oem, psm, lang, whitelist)
+            accuracy, latency = evaluate_grades(images, pages, config, threshold, coordinates_json)
+            measurements.append({'campo': 'notas', 'dpi': dpi, 'config': config, 'threshold': threshold,
+                                  'acuracia': accuracy, 'latencia': latency})
+            print(f"[notas] {dpi} DPI | {config} | threshold {threshold} | "
+                  f"acurácia {accuracy:.3f} | {latency:.2f}s/página")
+
+        if stack_size:
+            measurements.extend(sweep_stacked(images, pages, coordinates_json, dpi, oems, text_psms, grade_psms,
+                                              langs, whitelists, thresholds, stack_size))
+
+        del images
+
+    return measurements
+
+
+def sweep_stacked(images, pages, coordinates_json, dpi, oems, text_psms, grade_psms, langs, whitelists, thresholds,
+                  stack_size):
+    """Mede as configurações no OCR empilhado, como get_grades.py -e lê as páginas"""
+    # Nas pilhas, modos de linha única viram --psm 6; configurações que ficam iguais são medidas uma vez
+    text_configs = list(dict.fromkeys(
+        stack_config(build_config(oem, psm, lang)) for oem, psm, lang in itertools.product(oems, text_psms, langs)))
+    grade_configs = list(dict.fromkeys(
+        stack_config(build_config(oem, psm, lang, whitelist))
+        for oem, psm, lang, whitelist in itertools.product(oems, grade_psms, langs, whitelists)))
+
+    measurements = []
+    for threshold in thresholds:
+        page_crops = crop_labeled_pages(images, coordinates_json, threshold)
+        for field, configs, read, score in (('texto', text_configs, read_text_stacked, score_text),
+                                            ('notas', grade_configs, read_grades_stacked, score_grades)):
+            for config in configs:
+                accuracy, latency = evaluate_stacked(page_crops, pages, config, stack_size, read, score)
+                measurements.append({'campo': f'{field}_empilhado', 'dpi': dpi, 'config': config,
+                                     'threshold': threshold, 'pilha': stack_size,
+                                     'acuracia': accuracy, 'latencia': latency})
+                print(f"[{field} empilhado] {dpi} DPI | {config} | threshold {threshold} | "
+                      f"acurácia {accuracy:.3f} | {latency:.2f}s/página")
+
+    return measurements
+
+
+def choose_stacked(measurements, dpi, min_accuracy=None, tolerance=0.0):
+    """Escolhe a configuração de cada campo do OCR empilhado na resolução já escolhida"""
+    choice = {}
+    for field in ('texto', 'notas'):
+        candidates = [m for m in measurements if m['campo'] == f'{field}_empilhado' and m['dpi'] == dpi]
+        best = max(m['acuracia'] for m in candidates)
+        target = min(min_accuracy, best) if min_accuracy is not None else best - tolerance
+        choice[field] = pick_fastest(pareto_front(candidates), target)
+
+    render_time = next(m['latencia'] for m in measurements if m['campo'] == 'renderizacao' and m['dpi'] == dpi)
+    return {
+        'pilha': choice['texto']['pilha'],
+        'texto': {'config': choice['texto']['config'], 'threshold': choice['texto']['threshold']},
+        'notas': {'config': choice['notas']['config'], 'threshold': choice['notas']['threshold']},
+        'metricas': {
+            'acuracia_texto': choice['texto']['acuracia'],
+            'acuracia_notas': choice['notas']['acuracia'],
+            'latencia_pagina': render_time + choice['texto']['latencia'] + choice['notas']['latencia'],
+        }
+    }
+
+
+def choose_settings(measurements, min_accuracy=None, tolerance=0.0):
+    """Escolhe DPI e configuração de cada campo na fronteira de Pareto, minimizando o tempo total por página"""
+    fields = ('texto', 'notas')
+    targets = {}
+    for field in fields:
+        best = max(m['acuracia'] for m in measurements if m['campo'] == field)
+        targets[field] = min(min_accuracy, best) if min_accuracy is not None else best - tolerance
+
+    options = []
+    for dpi in sorted({m['dpi'] for m in measurements}):
+        render_time = next(m['latencia'] for m in measurements if m['campo'] == 'renderizacao' and m['dpi'] == dpi)
+        choice = {}
+        for field in fields:
+            front = pareto_front([m for m in measurements if m['campo'] == field and m['dpi'] == dpi])
+            choice[field] = pick_fastest(front, targets[field])
+
+        meets_targets = all(choice[field]['acuracia'] >= targets[field] for field in fields)
+        total_accuracy = sum(choice[field]['acuracia'] for field in fields)
+        total_latency = render_time + sum(choice[field]['latencia'] for field in fields)
+        options.append((meets_targets, total_accuracy, total_latency, dpi, choice))
+
+    # Prefere a resolução mais rápida entre as que atingem os alvos
+    eligible = [o for o in options if o[0]]
+    if eligible:
+        _, _, total_latency, dpi, choice = min(eligible, key=lambda o: o[2])
+    else:
+        print("\n⚠️ Aviso: nenhuma resolução atingiu a acurácia alvo em todos os campos; usando a mais precisa")
+        _, _, total_latency, dpi, choice = max(options, key=lambda o: (o[1], -o[2]))
+
+    settings = {
+        'dpi': dpi,
+        'texto': {'config': choice['texto']['config'], 'threshold': choice['texto']['threshold']},
+        'notas': {'config': choice['notas']['config'], 'threshold': choice['notas']['threshold']},
+        'metricas': {
+            'acuracia_texto': choice['texto']['acuracia'],
+            'acuracia_notas': choice['notas']['acuracia'],
+            'latencia_pagina': total_latency,
+        }
+    }
+
+    # O OCR empilhado usa a mesma resolução, mas tem configuração e métricas próprias
+    if any(m['campo'] == 'texto_empilhado' for m in measurements):
+        settings['empilhado'] = choose_stacked(measurements, dpi, min_accuracy, tolerance)
+
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ajusta as configurações de OCR usando páginas rotuladas')
+    parser.add_argument('labels', help='Arquivo JSON com o PDF e os valores esperados de cada página')
+    parser.add_argument('-c', '--coordinates', required=True,
+                        help='Arquivo JSON de coordenadas (recebe a configuração escolhida na chave "ocr")')
+    parser.add_argument('--dpi', type=int, nargs='+', default=[300, 400], help='Resoluções testadas')
+    parser.add_argument('--oem', type=int, nargs='+', default=[1, 3], help='Modos de engine (OEM) testados')
+    parser.add_argument('--psm', type=int, nargs='+', default=[6, 7],
+                        help='Modos de segmentação (PSM) testados nas notas (padrão: 6 7)')
+    parser.add_argument('--psm-texto', type=int, nargs='+', default=[4, 6],
+                        help='Modos de segmentação (PSM) testados no texto, que ocupa várias linhas (padrão: 4 6)')
+    parser.add_argument('--idiomas', nargs='+', default=['por', 'por+eng'], help='Idiomas testados')
+    parser.add_argument('--thresholds', type=int, nargs='+', default=[130, 150, 170],
+                        help='Limiares de binarização testados')
+    parser.add_argument('--whitelists', nargs='+', default=['nenhuma', GRADE_WHITELIST],
+                        help='Whitelists de caracteres testadas nas notas ("nenhuma" desativa)')
+    parser.add_argument('--empilhar', type=int, default=0, metavar='N',
+                        help='Mede também o OCR empilhado (get_grades.py -e N) com N páginas por pilha '
+                             '(padrão: 0, desativado)')
+    parser.add_argument('--acuracia-minima', type=float, default=None,
+                        help='Acurácia mínima aceitável por campo (padrão: a melhor medida menos a tolerância)')
+    parser.add_argument('--tolerancia', type=float, default=0.0,
+                        help='Perda de acurácia aceita em relação à melhor medida (padrão: 0.0)')
+    parser.add_argument('--relatorio', help='Arquivo JSON para salvar todas as medições')
+    parser.add_argument('--nao-salvar', action='store_true', help='Apenas mostra a escolha, sem alterar as coordenadas')
+    args = parser.parse_args()
+
+    try:
+        labels = load_labels(args.labels)
+        with open(args.coordinates, 'r', encoding='utf-8') as f:
+            coordinates_json = json.load(f)
+    except Exception as e:
+        print(f"Erro ao carregar arquivos de entrada: {e}")
+        return
+
+    print(f"Configuração atual: {json.dumps(get_ocr_settings(coordinates_json), ensure_ascii=False)}")
+
+    whitelists = [None if w == 'nenhuma' else w for w in args.whitelists]
+    try:
+        measurements = sweep(labels, coordinates_json, args.dpi, args.oem, args.psm_texto, args.psm, args.idiomas,
+                             whitelists, args.thresholds, max(0, args.empilhar))
+    except Exception as e:
+        print(f"Erro durante a varredura: {e}")
+        return
+
+    if args.relatorio:
+        with open(args.relatorio, 'w', encoding='utf-8') as f:
+            json.dump(measurements, f, indent=2, ensure_ascii=False)
+        print(f"\nMedições salvas em {args.relatorio}")
+
+    settings = choose_settings(measurements, args.acuracia_minima, args.tolerancia)
+    print(f"\nConfiguração escolhida: {json.dumps(settings, indent=2, ensure_ascii=False)}")
+
+    if args.nao_salvar:
+        return
+
+    coordinates_json['ocr'] = settings
+    with open(args.coordinates, 'w', encoding='utf-8') as f:
+        json.dump(coordinates_json, f, indent=4, ensure_ascii=False)
+    print(f"Configuração salva em {args.coordinates}")
+
+
+if __name__ == "__main__":
+    main()